@@ -8,17 +8,22 @@ import pytest
 import os
 import sys
 
+from filelock import FileLock
+
 # Add test/lib to path
 test_lib_path = os.path.join(os.path.dirname(__file__), 'lib')
 if test_lib_path not in sys.path:
     sys.path.insert(0, test_lib_path)
 
-from environment import TestEnvironment, kubectl
+from environment import ApiProxy, TestEnvironment, kubectl
 
 
 # Global test environment instance
 _test_env = None
 
+# Fixtures that need a running cluster; tests using them are marked slow
+CLUSTER_FIXTURES = {"cluster", "docker_image", "redis_deployment", "sonic_deployment", "network_device", "api", "crds"}
+
 
 def pytest_addoption(parser):
     """Add custom pytest options."""
@@ -28,6 +33,15 @@ def pytest_addoption(parser):
     )
 
 
+def reuse_deployments(config):
+    """Whether healthy Redis and agent deployments may be reused.
+    
+    On by default for fast local iteration; set SONIC_REUSE_CLUSTER=0 to
+    force clean deploys (as CI should).
+    """
+    return config.getoption("--reuse-env") or os.getenv("SONIC_REUSE_CLUSTER", "1") != "0"
+
+
 @pytest.fixture(scope="session")
 def cluster(request):
     """Create and manage test cluster lifecycle."""
@@ -49,7 +63,7 @@ def cluster(request):
 
 
 @pytest.fixture(scope="session")
-def docker_image(request):
+def docker_image(request, tmp_path_factory):
     """Build test Docker image."""
     global _test_env
     
@@ -60,7 +74,16 @@ def docker_image(request):
     skip_build = reuse_env or bool(os.getenv("SKIP_DOCKER_BUILD"))
     
     try:
-        _test_env.build_image(skip_if_exists=skip_build)
+        if os.environ.get("PYTEST_XDIST_WORKER"):
+            # Images are shared by all workers on the host: the first worker
+            # builds them, the rest wait on the lock and reuse the result
+            root = tmp_path_factory.getbasetemp().parent
+            with FileLock(str(root / "docker_image.lock")):
+                marker = root / "docker_image.built"
+                _test_env.build_image(skip_if_exists=skip_build or marker.exists())
+                marker.touch()
+        else:
+            _test_env.build_image(skip_if_exists=skip_build)
     except Exception as e:
         pytest.fail(f"Failed to build image: {e}")
     
@@ -68,12 +91,12 @@ def docker_image(request):
 
 
 @pytest.fixture(scope="session") 
-def redis_deployment(cluster):
+def redis_deployment(request, cluster):
     """Deploy Redis with CONFIG_DB."""
     global _test_env
     
     try:
-        _test_env.deploy_redis()
+        _test_env.deploy_redis(skip_if_running=reuse_deployments(request.config))
     except Exception as e:
         pytest.fail(f"Failed to deploy Redis: {e}")
     
@@ -81,39 +104,84 @@ def redis_deployment(cluster):
 
 
 @pytest.fixture(scope="session")
-def sonic_deployment(cluster, docker_image, redis_deployment):
+def sonic_deployment(request, cluster, docker_image, redis_deployment):
     """Deploy sonic-change-agent."""
     global _test_env
     
     try:
-        _test_env.deploy_agent()
+        _test_env.deploy_agent(skip_if_running=reuse_deployments(request.config))
     except Exception as e:
         pytest.fail(f"Failed to deploy sonic-change-agent: {e}")
     
     yield "sonic-change-agent"
 
 
-@pytest.fixture
-def network_device():
-    """Factory to create and cleanup NetworkDevice resources."""
+@pytest.fixture(scope="session")
+def api(cluster):
+    """Shared API server client over a single kubectl proxy."""
+    proxy = ApiProxy()
+    try:
+        proxy.start()
+    except Exception as e:
+        pytest.fail(f"Failed to start kubectl proxy: {e}")
+    
+    yield proxy
+    
+    proxy.stop()
+
+
+@pytest.fixture(scope="session")
+def crds(api, sonic_deployment):
+    """Installed CRDs keyed by name, fetched once per session."""
+    return {crd["metadata"]["name"]: crd for crd in api.list_crds()}
+
+
+@pytest.fixture(scope="module")
+def network_device(sonic_deployment):
+    """Factory to create NetworkDevice resources, cleaned up once per module."""
     global _test_env
+    created = []
     
     def _create_device(name, **spec_kwargs):
+        # Devices are shared by the module; start each test from a fresh
+        # object so status left by an earlier test cannot leak into it
+        if name in created:
+            _test_env.delete_devices(name)
+        
         try:
-            return _test_env.create_device(name, **spec_kwargs)
+            _test_env.create_device(name, **spec_kwargs)
         except Exception as e:
             pytest.fail(f"Failed to create NetworkDevice {name}: {e}")
+        if name not in created:
+            created.append(name)
+        return name
     
     yield _create_device
     
-    # Cleanup is handled by TestEnvironment
+    # Delete everything this module created in a single kubectl call
+    if _test_env is not None and created:
+        _test_env.delete_devices(*created)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def module_logs(request):
+    """Collect logs once after all tests in a module have run."""
+    yield
+    
+    # Nothing to collect unless a test in this session brought up the cluster
+    global _test_env
+    if _test_env is not None:
+        _test_env.collect_logs(request.module.__name__)
 
 
 @pytest.fixture(autouse=True)
-def auto_collect_logs(request, sonic_deployment):
-    """Automatically collect logs after each test."""
+def auto_collect_logs(request, module_logs):
+    """Collect logs after tests marked with @pytest.mark.collect_logs."""
     yield  # Run the test
     
+    if request.node.get_closest_marker("collect_logs") is None:
+        return
+    
     # Collect logs after test completion
     global _test_env
     if _test_env is not None:
@@ -128,7 +196,15 @@ def auto_collect_logs(request, sonic_deployment):
 def pytest_configure(config):
     """Configure pytest with custom markers."""
     config.addinivalue_line("markers", "workflow: marks tests that validate workflow execution")
-    config.addinivalue_line("markers", "slow: marks tests as slow")
+    config.addinivalue_line("markers", "slow: marks tests as slow (added automatically to tests that need the cluster)")
+    config.addinivalue_line("markers", "collect_logs: collect cluster logs after this test")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Mark every test that needs the cluster as slow."""
+    for item in items:
+        if CLUSTER_FIXTURES.intersection(getattr(item, "fixturenames", ())):
+            item.add_marker(pytest.mark.slow)
 
 
 def pytest_runtest_makereport(item, call):
@@ -160,6 +236,8 @@ def pytest_sessionfinish(session, exitstatus):
     if _test_env is not None and not reuse_env:
         print("\n🧹 Cleaning up test environment...")
         try:
-            _test_env.cleanup()
+            # Keep the cluster for the next run unless a hard clean is requested
+            _test_env.cleanup(keep_cluster=not os.getenv("SONIC_TEST_HARD_CLEAN"),
+                              keep_deployments=reuse_deployments(session.config))
         except Exception as e:
             print(f"Warning: Cleanup failed: {e}")
\ No newline at end of file
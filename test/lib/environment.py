@@ -5,52 +5,363 @@ Provides a reusable TestEnvironment class that can be used both by pytest fixtur
 and standalone scripts for manual testing/debugging.
 """
 
+import functools
+import hashlib
+import shutil
 import subprocess
+import tempfile
+import threading
 import time
 import os
-import tempfile
-import yaml
 import json
+import re
+import signal
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Fixed kubectl discovery cache so API discovery is paid once, not per fresh
+# HOME; CI can point it at a persisted directory
+KUBECTL_CACHE_DIR = os.environ.get(
+    "SONIC_TEST_KUBE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "sonic-test", "kube"))
 
-def run_cmd(cmd, capture=True, cwd=None):
-    """Run command and return result."""
+# BuildKit lets concurrent builds share base layer pulls
+BUILDKIT_ENV = {**os.environ, "DOCKER_BUILDKIT": "1", "BUILDKIT_PROGRESS": "plain"}
+
+
+def run_cmd(cmd, capture=True, cwd=None, input=None, env=None, as_text=True):
+    """Run command and return result.
+    
+    Pass as_text=False to get captured output as bytes, e.g. for JSON that
+    goes straight to json.loads.
+    """
     if isinstance(cmd, str):
         cmd = cmd.split()
     
     if capture:
-        return subprocess.run(cmd, capture_output=True, text=True, cwd=cwd)
+        return subprocess.run(cmd, capture_output=True, text=as_text, cwd=cwd, input=input, env=env)
     else:
-        return subprocess.run(cmd, cwd=cwd)
+        return subprocess.run(cmd, cwd=cwd, input=input, text=input is not None, env=env)
+
+
+def retry_cmd(cmd, tries=3, backoff=5):
+    """Run a flake-prone command, retrying with exponential backoff on failure."""
+    for attempt in range(tries):
+        result = run_cmd(cmd)
+        if result.returncode == 0:
+            return result
+        if attempt < tries - 1:
+            print(f"  ⚠️  {' '.join(cmd[:3])} failed, retrying...")
+            time.sleep(backoff * (2 ** attempt))
+    return result
+
+
+def default_cluster_name():
+    """Return the minikube profile name, isolated per pytest-xdist worker."""
+    worker_id = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker_id:
+        return f"sonic-test-{worker_id}"
+    return "sonic-test"
+
+
+@functools.lru_cache(maxsize=None)
+def _kubectl_prefix(profile):
+    """Resolve how to invoke kubectl for a minikube profile.
+    
+    minikube registers a kubeconfig context named after the profile, so an
+    installed kubectl can talk to the cluster directly without going through
+    the `minikube kubectl` wrapper on every call.
+    """
+    cache_dir = f"--cache-dir={KUBECTL_CACHE_DIR}"
+    kubectl_path = shutil.which("kubectl")
+    if kubectl_path:
+        return [kubectl_path, "--context", profile, cache_dir]
+    return ["minikube", "kubectl", "--profile", profile, "--", cache_dir]
 
 
-def kubectl(*args):
+def kubectl_cmd(*args, request_timeout="10s"):
+    """Build the kubectl command line for the test cluster.
+    
+    Every request is bounded by request_timeout; pass "0" for streams and
+    waits that are bounded by their own timeout instead.
+    """
+    flags = [f"--request-timeout={request_timeout}", "--v=0"]
+    return _kubectl_prefix(default_cluster_name()) + flags + list(args)
+
+
+def kubectl(*args, input=None, as_text=True, request_timeout="10s"):
     """Helper to run kubectl commands in test cluster."""
-    cmd = ["minikube", "kubectl", "--profile", "sonic-test", "--"] + list(args)
-    return run_cmd(cmd)
+    return run_cmd(kubectl_cmd(*args, request_timeout=request_timeout), input=input, as_text=as_text)
+
+
+def _terminate(proc):
+    """Terminate a process started with start_new_session=True and its children.
+    
+    Signalling the whole group also stops kubectl when it runs under the
+    `minikube kubectl` wrapper, which would otherwise keep the pipe open.
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def follow_logs(markers, resource="daemonset/sonic-change-agent", tail=50, since=None,
+                since_time=None, timeout=60):
+    """Follow a resource's logs until every marker has been seen.
+    
+    Logs start from the last `tail` lines, from `since` (e.g. "1m"), or from
+    `since_time` (an aware datetime) when given. Returns the set of markers
+    that did not appear before the timeout.
+    """
+    pending = set(markers)
+    pattern = re.compile("|".join(map(re.escape, pending)))
+    if since_time:
+        window = f"--since-time={since_time.isoformat(timespec='seconds')}"
+    elif since:
+        window = f"--since={since}"
+    else:
+        window = f"--tail={tail}"
+    proc = subprocess.Popen(kubectl_cmd("logs", "-f", resource, window, request_timeout="0"),
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1,
+                            start_new_session=True)
+    # Ends the read loop below if the log stream goes quiet
+    timer = threading.Timer(timeout, _terminate, args=(proc,))
+    timer.start()
+    try:
+        for line in proc.stdout:
+            for match in pattern.finditer(line):
+                pending.discard(match.group(0))
+            if not pending:
+                break
+    finally:
+        timer.cancel()
+        _terminate(proc)
+        proc.wait()
+    return pending
+
+
+def wait_for_device_state(name, terminal_states=("completed", "failed"), timeout=60):
+    """Watch a NetworkDevice until its operationState reaches a terminal state.
+    
+    Returns the terminal state, or None if it was not reached before the timeout.
+    """
+    proc = subprocess.Popen(
+        kubectl_cmd("get", "networkdevice", name, "--watch",
+                    "-o", 'jsonpath={.status.operationState}{"\\n"}', request_timeout="0"),
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, bufsize=1,
+        start_new_session=True)
+    timer = threading.Timer(timeout, _terminate, args=(proc,))
+    timer.start()
+    try:
+        for line in proc.stdout:
+            state = line.strip()
+            if state in terminal_states:
+                return state
+    finally:
+        timer.cancel()
+        _terminate(proc)
+        proc.wait()
+    return None
+
+
+def wait_for(condition, retries=3, backoff=2):
+    """Retry a blocking readiness check with exponential backoff.
+    
+    The condition is expected to do its own waiting (e.g. `kubectl wait`);
+    retries only absorb transient API server failures. Callers size that
+    wait as a third of their overall budget, since it may run `retries` times.
+    """
+    for attempt in range(retries):
+        if condition():
+            return True
+        if attempt < retries - 1:
+            time.sleep(backoff * (2 ** attempt))
+    return False
+
+
+def wait_until(pred, timeout=30, initial=0.1, factor=2.0, cap=2.0):
+    """Poll pred with capped exponential backoff until it returns a truthy value.
+    
+    Returns that value, or raises TimeoutError once the timeout expires.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial
+    while time.monotonic() < deadline:
+        result = pred()
+        if result:
+            return result
+        time.sleep(min(delay, cap, max(0, deadline - time.monotonic())))
+        delay *= factor
+    raise TimeoutError(f"{getattr(pred, '__name__', pred)} not satisfied within {timeout}s")
+
+
+class ApiProxy:
+    """Talks to the test cluster's API server through a single `kubectl proxy`.
+    
+    The proxy handles authentication once; requests then reuse pooled
+    keep-alive connections instead of forking kubectl per query.
+    """
+    
+    def __init__(self):
+        self.proc = None
+        self.base_url = None
+        self.session = None
+    
+    def start(self, timeout=30):
+        """Start kubectl proxy on a free local port."""
+        # stderr goes to a file so a chatty proxy can never block on a full pipe
+        with tempfile.TemporaryFile(mode="w+") as stderr:
+            self.proc = subprocess.Popen(kubectl_cmd("proxy", "--port=0", request_timeout="0"),
+                                         stdout=subprocess.PIPE, stderr=stderr, text=True,
+                                         start_new_session=True)
+            # kubectl prints "Starting to serve on 127.0.0.1:<port>" once listening;
+            # the timer ends the read if it stalls before that
+            timer = threading.Timer(timeout, _terminate, args=(self.proc,))
+            timer.start()
+            try:
+                line = self.proc.stdout.readline()
+            finally:
+                timer.cancel()
+            match = re.search(r"serve on ([\d.]+:\d+)", line)
+            if not match:
+                self.stop()
+                stderr.seek(0)
+                raise Exception(f"Failed to start kubectl proxy: {line or stderr.read() or 'timed out'}")
+        
+        self.base_url = f"http://{match.group(1)}"
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        return self
+    
+    def stop(self):
+        """Stop the proxy and close pooled connections."""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        if self.proc is not None:
+            _terminate(self.proc)
+            self.proc.wait()
+            self.proc = None
+    
+    def get(self, path):
+        """GET an API path and return the decoded JSON object."""
+        response = self.session.get(f"{self.base_url}{path}", timeout=10)
+        response.raise_for_status()
+        return response.json()
+    
+    def get_network_device(self, name, namespace="default"):
+        """Return a NetworkDevice object."""
+        return self.get(f"/apis/sonic.k8s.io/v1/namespaces/{namespace}/networkdevices/{name}")
+    
+    def list_pods(self, namespace="default"):
+        """Return the pods in a namespace."""
+        return self.get(f"/api/v1/namespaces/{namespace}/pods")["items"]
+    
+    def list_crds(self):
+        """Return all installed CustomResourceDefinitions."""
+        return self.get("/apis/apiextensions.k8s.io/v1/customresourcedefinitions")["items"]
 
 
 class TestEnvironment:
     """Manages the complete test environment for sonic-change-agent."""
     
-    def __init__(self, cluster_name="sonic-test", image_name="sonic-change-agent:test"):
-        self.cluster_name = cluster_name
+    MANIFESTS = ("crd.yaml", "rbac.yaml", "daemonset.yaml")
+    FINGERPRINT_FILES = ("Dockerfile.sonic-change-agent", "Dockerfile.gnoi-light") + tuple(
+        os.path.join("manifests", name) for name in MANIFESTS)
+    
+    # NetworkDevice spec shared by every test device; callers override fields
+    DEVICE_SPEC_DEFAULTS = {
+        "type": "leafRouter",
+        "osVersion": "202505.01",
+        "firmwareProfile": "SONiC-Test-Profile",
+        "operation": "OSUpgrade",
+        "operationAction": "PreloadImage",
+    }
+    
+    def __init__(self, cluster_name=None, image_name="sonic-change-agent:test"):
+        self.cluster_name = cluster_name or default_cluster_name()
         self.image_name = image_name
         self.gnoi_image_name = "gnoi-light:test"
         self.created_devices = []
+        self._image_cache = {}
+        
+        # Project root: test/lib/environment.py -> project root (2 levels up)
+        self.project_root = os.path.abspath(os.path.join(__file__, "..", "..", ".."))
+        
+        self._manifests = {}
+        for name in self.MANIFESTS:
+            with open(os.path.join(self.project_root, "manifests", name), "r") as f:
+                self._manifests[name] = f.read()
+        
+        # DaemonSet manifest with the test image substituted in
+        self._daemonset_rendered = self._manifests["daemonset.yaml"].replace(
+            "sonic-change-agent:latest", self.image_name)
+        
+        self.fingerprint_path = os.path.join(
+            os.path.expanduser("~"), ".cache", "sonic-test", f"{self.cluster_name}.fingerprint")
+    
+    def _fingerprint(self):
+        """Hash the Dockerfiles and manifests the test cluster is built from."""
+        h = hashlib.sha256()
+        for path in self.FINGERPRINT_FILES:
+            with open(os.path.join(self.project_root, path), "rb") as f:
+                h.update(f.read())
+        return h.hexdigest()
+    
+    def _cluster_reusable(self):
+        """Check whether the running cluster was built from the current sources."""
+        try:
+            with open(self.fingerprint_path, "r") as f:
+                if f.read().strip() != self._fingerprint():
+                    return False
+        except FileNotFoundError:
+            return False
+        
+        result = run_cmd(["minikube", "status", "--profile", self.cluster_name, "-o", "json"],
+                         as_text=False)
+        try:
+            return json.loads(result.stdout).get("Host") == "Running"
+        except (json.JSONDecodeError, AttributeError):
+            return False
+    
+    def _write_fingerprint(self):
+        """Record the sources the current cluster was deployed from."""
+        os.makedirs(os.path.dirname(self.fingerprint_path), exist_ok=True)
+        with open(self.fingerprint_path, "w") as f:
+            f.write(self._fingerprint())
+    
+    def _clear_fingerprint(self):
+        """Forget the recorded cluster fingerprint."""
+        if os.path.exists(self.fingerprint_path):
+            os.unlink(self.fingerprint_path)
+    
+    def _kubectl_apply(self, manifest):
+        """Apply a manifest (dict or YAML/JSON text) by piping it to kubectl."""
+        if isinstance(manifest, dict):
+            manifest = json.dumps(manifest)
+        return kubectl("apply", "-f", "-", input=manifest)
     
     def setup_cluster(self):
         """Create and configure test cluster."""
         print(f"\n🏗️  Setting up test cluster: {self.cluster_name}")
         
+        # Keep a running cluster that was built from the same sources
+        if self._cluster_reusable():
+            print("✅ Reusing running cluster (fingerprint unchanged)")
+            return
+        
         # Clean up existing cluster
         print("Cleaning up any existing cluster...")
+        self._clear_fingerprint()
         run_cmd(["minikube", "delete", "--profile", self.cluster_name])
         
         # Create cluster
         print("Creating minikube cluster...")
-        result = run_cmd([
+        result = retry_cmd([
             "minikube", "start", 
             "--profile", self.cluster_name,
             "--driver=docker",
@@ -62,44 +373,48 @@ class TestEnvironment:
         
         # Wait for cluster ready
         print("Waiting for cluster to be ready...")
-        for i in range(30):
-            result = kubectl("get", "nodes")
-            if result.returncode == 0 and "Ready" in result.stdout:
-                print("✅ Cluster is ready")
-                break
-            time.sleep(5)
-        else:
+        if not wait_for(lambda: kubectl(
+                "wait", "--for=condition=Ready", "nodes", "--all", "--timeout=50s",
+                request_timeout="0").returncode == 0):
             raise Exception("Cluster not ready after 2.5 minutes")
+        print("✅ Cluster is ready")
     
     def build_image(self, skip_if_exists=False):
         """Build Docker images for testing."""
         print(f"\n🐳 Building Docker images: {self.image_name}, {self.gnoi_image_name}")
         
-        # Get project root: test/lib/environment.py -> project root (2 levels up)
-        project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        project_root = self.project_root
+        
+        builds = []
         
         # Build sonic-change-agent image
-        if skip_if_exists:
-            result = run_cmd(["docker", "inspect", self.image_name])
-            if result.returncode == 0:
-                print(f"✅ Using existing Docker image: {self.image_name}")
-            else:
-                self._build_sonic_agent_image(project_root)
+        if skip_if_exists and self._image_exists(self.image_name):
+            print(f"✅ Using existing Docker image: {self.image_name}")
         else:
-            self._build_sonic_agent_image(project_root)
+            builds.append(self._build_sonic_agent_image)
         
         # Build gnoi-light image
-        if skip_if_exists:
-            result = run_cmd(["docker", "inspect", self.gnoi_image_name])
-            if result.returncode == 0:
-                print(f"✅ Using existing Docker image: {self.gnoi_image_name}")
-            else:
-                self._build_gnoi_light_image(project_root)
+        if skip_if_exists and self._image_exists(self.gnoi_image_name):
+            print(f"✅ Using existing Docker image: {self.gnoi_image_name}")
         else:
-            self._build_gnoi_light_image(project_root)
+            builds.append(self._build_gnoi_light_image)
+        
+        # The builds are independent, so run them concurrently
+        if builds:
+            with ThreadPoolExecutor(max_workers=len(builds)) as executor:
+                futures = [executor.submit(build, project_root) for build in builds]
+                for future in futures:
+                    future.result()
         
         print("✅ Docker images built")
     
+    def _image_exists(self, name):
+        """Check whether a Docker image exists locally, caching the answer."""
+        if name not in self._image_cache:
+            result = run_cmd(["docker", "images", "-q", name])
+            self._image_cache[name] = result.returncode == 0 and result.stdout.strip() != ""
+        return self._image_cache[name]
+    
     def _build_sonic_agent_image(self, project_root):
         """Build sonic-change-agent Docker image."""
         dockerfile_path = os.path.join(project_root, "Dockerfile.sonic-change-agent")
@@ -107,9 +422,11 @@ class TestEnvironment:
         if not os.path.exists(dockerfile_path):
             raise Exception(f"Dockerfile not found at {dockerfile_path}")
         
-        result = run_cmd(["docker", "build", "-f", dockerfile_path, "-t", self.image_name, "."], cwd=project_root)
+        result = run_cmd(["docker", "build", "-f", dockerfile_path, "-t", self.image_name, "."],
+                         cwd=project_root, env=BUILDKIT_ENV)
         if result.returncode != 0:
             raise Exception(f"Failed to build sonic-change-agent image: {result.stderr}")
+        self._image_cache.pop(self.image_name, None)
     
     def _build_gnoi_light_image(self, project_root):
         """Build gnoi-light Docker image."""
@@ -118,12 +435,20 @@ class TestEnvironment:
         if not os.path.exists(dockerfile_path):
             raise Exception(f"Dockerfile not found at {dockerfile_path}")
         
-        result = run_cmd(["docker", "build", "-f", dockerfile_path, "-t", self.gnoi_image_name, "."], cwd=project_root)
+        result = run_cmd(["docker", "build", "-f", dockerfile_path, "-t", self.gnoi_image_name, "."],
+                         cwd=project_root, env=BUILDKIT_ENV)
         if result.returncode != 0:
             raise Exception(f"Failed to build gnoi-light image: {result.stderr}")
+        self._image_cache.pop(self.gnoi_image_name, None)
     
-    def deploy_redis(self):
+    def deploy_redis(self, skip_if_running=False):
         """Deploy Redis with CONFIG_DB configuration."""
+        if skip_if_running:
+            result = kubectl("get", "deployment/redis", "-o", "jsonpath={.status.readyReplicas}")
+            if result.returncode == 0 and int(result.stdout.strip() or 0) >= 1:
+                print("✅ Using running Redis deployment")
+                return
+        
         print("\n📦 Deploying Redis...")
         
         # Redis manifest
@@ -153,123 +478,131 @@ class TestEnvironment:
         }
         
         # Deploy Redis
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-            yaml.dump(redis_manifest, f)
-            manifest_path = f.name
+        result = self._kubectl_apply(redis_manifest)
+        if result.returncode != 0:
+            raise Exception(f"Failed to deploy Redis: {result.stderr}")
         
-        try:
-            result = kubectl("apply", "-f", manifest_path)
-            if result.returncode != 0:
-                raise Exception(f"Failed to deploy Redis: {result.stderr}")
-            
-            # Wait for Redis
-            print("Waiting for Redis to be ready...")
-            for i in range(12):
-                result = kubectl("get", "pods", "-l", "app=redis")
-                if result.returncode == 0 and "Running" in result.stdout:
-                    break
-                time.sleep(5)
-            else:
-                raise Exception("Redis not ready")
-            
-            # Configure Redis - get node IP
-            result = kubectl("get", "nodes", "-o", "jsonpath={.items[0].status.addresses[0].address}")
-            if result.returncode != 0:
-                raise Exception("Failed to get node IP")
-            
-            node_ip = result.stdout.strip()
-            print(f"Using node IP: {node_ip}")
-            
-            # Set CONFIG_DB data in database 4
-            config_commands = [
-                f"redis-cli -n 4 HSET 'KUBERNETES_MASTER|SERVER' ip '{node_ip}' port '8443' insecure 'False' disable 'False'",
-                f"redis-cli -n 4 HSET 'GNMI|gnmi' port '8080' client_auth 'false'"
-            ]
-            
-            for cmd in config_commands:
-                result = kubectl("exec", "deployment/redis", "--", "sh", "-c", cmd)
-                if result.returncode != 0:
-                    raise Exception(f"Failed to set Redis config: {cmd}")
-            
-            print("✅ Redis deployed and configured")
-            
-        finally:
-            os.unlink(manifest_path)
+        # Wait for Redis
+        print("Waiting for Redis to be ready...")
+        if not wait_for(lambda: kubectl(
+                "wait", "--for=condition=available", "deployment/redis", "--timeout=20s",
+                request_timeout="0").returncode == 0):
+            raise Exception("Redis not ready")
+        
+        # Configure Redis - get node IP
+        result = kubectl("get", "nodes", "-o", "jsonpath={.items[0].status.addresses[0].address}")
+        if result.returncode != 0:
+            raise Exception("Failed to get node IP")
+        
+        node_ip = result.stdout.strip()
+        print(f"Using node IP: {node_ip}")
+        
+        # Set CONFIG_DB data in database 4 with a single redis-cli session
+        config_commands = [
+            f"HSET 'KUBERNETES_MASTER|SERVER' ip '{node_ip}' port '8443' insecure 'False' disable 'False'",
+            "HSET 'GNMI|gnmi' port '8080' client_auth 'false'"
+        ]
+        
+        result = kubectl("exec", "-i", "deployment/redis", "--", "redis-cli", "-n", "4",
+                         input="\n".join(config_commands) + "\n")
+        if result.returncode != 0 or "ERR" in result.stdout:
+            raise Exception(f"Failed to set Redis config: {result.stderr or result.stdout}")
+        
+        print("✅ Redis deployed and configured")
     
-    def deploy_agent(self):
+    def deploy_agent(self, skip_if_running=False):
         """Deploy sonic-change-agent to cluster."""
+        manifest_hash = self._deployment_hash()
+        
+        if skip_if_running and self._agent_healthy(manifest_hash):
+            print("✅ Using running sonic-change-agent deployment")
+            return
+        
         print(f"\n🚀 Deploying sonic-change-agent with images: {self.image_name}, {self.gnoi_image_name}")
         
         # Load images into cluster
         print("Loading Docker images into cluster...")
-        result = run_cmd(["minikube", "image", "load", self.image_name, "--profile", self.cluster_name])
+        result = retry_cmd(["minikube", "image", "load", self.image_name, "--profile", self.cluster_name])
         if result.returncode != 0:
             raise Exception(f"Failed to load sonic-change-agent image: {result.stderr}")
         
-        result = run_cmd(["minikube", "image", "load", self.gnoi_image_name, "--profile", self.cluster_name])
+        result = retry_cmd(["minikube", "image", "load", self.gnoi_image_name, "--profile", self.cluster_name])
         if result.returncode != 0:
             raise Exception(f"Failed to load gnoi-light image: {result.stderr}")
         
-        # Get project root: test/lib/environment.py -> project root (2 levels up)
-        project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        
         # Deploy CRD
         print("Deploying CRD...")
-        crd_path = os.path.join(project_root, "manifests", "crd.yaml")
-        result = kubectl("apply", "-f", crd_path)
+        result = self._kubectl_apply(self._manifests["crd.yaml"])
         if result.returncode != 0:
             raise Exception(f"Failed to deploy CRD: {result.stderr}")
         
         # Wait for CRD
-        for i in range(12):
-            result = kubectl("get", "crd", "networkdevices.sonic.k8s.io")
-            if result.returncode == 0:
-                break
-            time.sleep(5)
-        else:
+        if not wait_for(lambda: kubectl(
+                "wait", "--for=condition=established", "crd/networkdevices.sonic.k8s.io",
+                "--timeout=20s", request_timeout="0").returncode == 0):
             raise Exception("CRD not established")
         
         # Deploy RBAC
         print("Deploying RBAC...")
-        rbac_path = os.path.join(project_root, "manifests", "rbac.yaml")
-        result = kubectl("apply", "-f", rbac_path)
+        result = self._kubectl_apply(self._manifests["rbac.yaml"])
         if result.returncode != 0:
             raise Exception(f"Failed to deploy RBAC: {result.stderr}")
         
-        # Deploy DaemonSet with correct image
+        # Deploy DaemonSet with correct image; a changed hash restarts the pods
         print("Deploying DaemonSet...")
-        daemonset_path = os.path.join(project_root, "manifests", "daemonset.yaml")
-        with open(daemonset_path, "r") as f:
-            daemonset_content = f.read()
-        
-        # Update image names
-        updated_content = daemonset_content.replace("sonic-change-agent:latest", self.image_name)
-        
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-            f.write(updated_content)
-            daemonset_temp_path = f.name
-        
-        try:
-            result = kubectl("apply", "-f", daemonset_temp_path)
-            if result.returncode != 0:
-                raise Exception(f"Failed to deploy DaemonSet: {result.stderr}")
-            
-            # Wait for pod
-            print("Waiting for sonic-change-agent to be ready...")
-            for i in range(24):
-                result = kubectl("get", "pods", "-l", "app=sonic-change-agent")
-                if result.returncode == 0 and "Running" in result.stdout:
-                    # Additional check: ensure controller is synced
-                    result = kubectl("logs", "daemonset/sonic-change-agent", "--tail=20")
-                    if result.returncode == 0 and "Cache synced successfully" in result.stdout:
-                        print("✅ sonic-change-agent deployed and ready")
-                        break
-                time.sleep(5)
-            else:
-                raise Exception("sonic-change-agent not ready")
-            
-        finally:
-            os.unlink(daemonset_temp_path)
+        result = self._kubectl_apply(self._render_daemonset(manifest_hash))
+        if result.returncode != 0:
+            raise Exception(f"Failed to deploy DaemonSet: {result.stderr}")
+        
+        # Wait for pod
+        print("Waiting for sonic-change-agent to be ready...")
+        if not wait_for(lambda: kubectl(
+                "rollout", "status", "daemonset/sonic-change-agent", "--timeout=40s",
+                request_timeout="0").returncode == 0):
+            raise Exception("sonic-change-agent not ready")
+        
+        # Additional check: ensure controller is synced
+        if follow_logs(["Cache synced successfully"]):
+            raise Exception("sonic-change-agent cache not synced")
+        print("✅ sonic-change-agent deployed and ready")
+        self._write_fingerprint()
+    
+    def _deployment_hash(self):
+        """Hash the rendered DaemonSet together with the local image IDs.
+        
+        A rebuilt image changes the hash, so a running agent is only reused
+        when it runs exactly what this session would deploy.
+        """
+        digest = hashlib.sha256(self._daemonset_rendered.encode())
+        for name in (self.image_name, self.gnoi_image_name):
+            digest.update(run_cmd(["docker", "images", "-q", name]).stdout.strip().encode())
+        return digest.hexdigest()
+    
+    def _render_daemonset(self, manifest_hash):
+        """Return the DaemonSet manifest with the hash as a pod template annotation.
+        
+        The images use fixed tags, so changing the pod template is what makes
+        apply roll out pods running freshly loaded images.
+        """
+        anchor = "  template:\n    metadata:\n"
+        if anchor not in self._daemonset_rendered:
+            raise Exception("DaemonSet manifest has no pod template metadata to annotate")
+        return self._daemonset_rendered.replace(
+            anchor,
+            f'{anchor}      annotations:\n        sonic.k8s.io/manifest-hash: "{manifest_hash}"\n', 1)
+    
+    def _agent_healthy(self, manifest_hash):
+        """Check whether the deployed agent is current, fully ready and has its CRD."""
+        result = kubectl("get", "daemonset/sonic-change-agent", "-o",
+                         "jsonpath={.spec.template.metadata.annotations.sonic\\.k8s\\.io/manifest-hash}"
+                         "|{.status.numberReady}/{.status.desiredNumberScheduled}")
+        if result.returncode != 0:
+            return False
+        deployed_hash, _, counts = result.stdout.strip().partition("|")
+        ready, _, desired = counts.partition("/")
+        if deployed_hash != manifest_hash or not ready or ready != desired or ready == "0":
+            return False
+        return kubectl("get", "crd", "networkdevices.sonic.k8s.io", "-o", "name").returncode == 0
     
     def create_device(self, name, **spec_kwargs):
         """Create a NetworkDevice resource."""
@@ -277,31 +610,28 @@ class TestEnvironment:
             "apiVersion": "sonic.k8s.io/v1",
             "kind": "NetworkDevice", 
             "metadata": {"name": name},
-            "spec": {
-                "type": "leafRouter",
-                "osVersion": "202505.01", 
-                "firmwareProfile": "SONiC-Test-Profile",
-                "operation": "OSUpgrade",
-                "operationAction": "PreloadImage",
-                **spec_kwargs
-            }
+            "spec": {**self.DEVICE_SPEC_DEFAULTS, **spec_kwargs}
         }
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
-            yaml.dump(device_spec, f)
-            device_path = f.name
+        result = self._kubectl_apply(device_spec)
+        if result.returncode != 0:
+            raise Exception(f"Failed to create NetworkDevice {name}: {result.stderr}")
         
-        try:
-            result = kubectl("apply", "-f", device_path)
-            if result.returncode != 0:
-                raise Exception(f"Failed to create NetworkDevice {name}: {result.stderr}")
-            
+        if name not in self.created_devices:
             self.created_devices.append(name)
-            print(f"✅ Created NetworkDevice: {name}")
-            return name
-            
-        finally:
-            os.unlink(device_path)
+        print(f"✅ Created NetworkDevice: {name}")
+        return name
+    
+    def delete_devices(self, *names):
+        """Delete NetworkDevice resources with a single kubectl call."""
+        if not names:
+            return
+        
+        kubectl("delete", "networkdevice", *names, "--ignore-not-found=true")
+        for name in names:
+            if name in self.created_devices:
+                self.created_devices.remove(name)
+            print(f"🧹 Deleted NetworkDevice: {name}")
     
     def collect_logs(self, test_name):
         """Collect container logs for debugging."""
@@ -311,60 +641,79 @@ class TestEnvironment:
         
         print(f"\n📋 Collecting logs to: {log_dir}")
         
-        # Get all pods
-        result = kubectl("get", "pods", "-o", "json")
+        # Get all pods as namespace/name pairs
+        result = kubectl("get", "pods", "-o",
+                         'jsonpath={range .items[*]}{.metadata.namespace}/{.metadata.name}{"\\n"}{end}')
         if result.returncode != 0:
             print(f"Failed to get pods: {result.stderr}")
             return log_dir
         
-        try:
-            pods_data = json.loads(result.stdout)
-            pods = pods_data.get("items", [])
-        except json.JSONDecodeError:
-            print("Failed to parse pods JSON")
-            return log_dir
+        pods = [line.split("/", 1) for line in result.stdout.splitlines() if "/" in line]
         
-        # Collect logs from each pod
-        for pod in pods:
-            pod_name = pod["metadata"]["name"]
-            pod_namespace = pod["metadata"].get("namespace", "default")
-            
-            print(f"  📜 Collecting logs from {pod_name}...")
+        # Collect logs from all pods in parallel
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = {}
+            for pod_namespace, pod_name in pods:
+                print(f"  📜 Collecting logs from {pod_name}...")
+                futures[pod_name] = executor.submit(self._collect_pod_logs, pod_name, pod_namespace, log_dir)
             
-            # Get pod logs
-            result = kubectl("logs", pod_name, "-n", pod_namespace, "--all-containers=true")
-            if result.returncode == 0:
-                log_file = os.path.join(log_dir, f"{pod_name}.log")
-                with open(log_file, "w") as f:
-                    f.write(f"Pod: {pod_name}\n")
-                    f.write(f"Namespace: {pod_namespace}\n") 
-                    f.write(f"Collected: {datetime.now().isoformat()}\n")
-                    f.write("=" * 60 + "\n")
-                    f.write(result.stdout)
-            else:
-                print(f"    ⚠️  Failed to get logs from {pod_name}: {result.stderr}")
+            for pod_name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"    ⚠️  Failed to get logs from {pod_name}: {e}")
         
         print(f"✅ Logs collected in: {log_dir}")
         return log_dir
     
-    def cleanup(self):
-        """Clean up test environment."""
+    def _collect_pod_logs(self, pod_name, pod_namespace, log_dir):
+        """Stream logs of a single pod straight into its log file."""
+        log_file = os.path.join(log_dir, f"{pod_name}.log")
+        with open(log_file, "wb") as f:
+            f.write(f"Pod: {pod_name}\n".encode())
+            f.write(f"Namespace: {pod_namespace}\n".encode())
+            f.write(f"Collected: {datetime.now().isoformat()}\n".encode())
+            f.write(("=" * 60 + "\n").encode())
+            f.flush()
+            
+            proc = subprocess.Popen(
+                kubectl_cmd("logs", pod_name, "-n", pod_namespace, "--all-containers=true",
+                            request_timeout="30s"),
+                stdout=f, stderr=subprocess.PIPE, text=True)
+            _, stderr = proc.communicate()
+        
+        if proc.returncode != 0:
+            os.unlink(log_file)
+            print(f"    ⚠️  Failed to get logs from {pod_name}: {stderr}")
+    
+    def cleanup(self, keep_cluster=False, keep_deployments=False):
+        """Clean up test environment.
+        
+        With keep_cluster the minikube profile and Docker image are left in
+        place so the next run can reuse them; keep_deployments additionally
+        leaves Redis and the agent running.
+        """
         print(f"\n🧹 Cleaning up test environment...")
         
         # Delete created devices
-        for device_name in self.created_devices:
-            kubectl("delete", "networkdevice", device_name, "--ignore-not-found=true")
-            print(f"🧹 Deleted NetworkDevice: {device_name}")
+        self.delete_devices(*self.created_devices)
         
         # Clean up deployments
-        kubectl("delete", "daemonset", "sonic-change-agent", "--ignore-not-found=true")
-        kubectl("delete", "deployment", "redis", "--ignore-not-found=true")
+        if not (keep_cluster and keep_deployments):
+            kubectl("delete", "daemonset", "sonic-change-agent", "--ignore-not-found=true")
+            kubectl("delete", "deployment", "redis", "--ignore-not-found=true")
+        
+        if keep_cluster:
+            print(f"✅ Cleanup completed (kept cluster {self.cluster_name})")
+            return
         
         # Clean up cluster
+        self._clear_fingerprint()
         run_cmd(["minikube", "delete", "--profile", self.cluster_name])
         
         # Clean up Docker images
         run_cmd(["docker", "rmi", self.image_name], capture=False)
+        self._image_cache.pop(self.image_name, None)
         
         print("✅ Cleanup completed")
     
@@ -16,7 +16,10 @@ from environment import TestEnvironment
 
 
 def main():
-    parser = argparse.ArgumentParser(description='Manage sonic-change-agent development environment')
+    parser = argparse.ArgumentParser(
+        description='Manage sonic-change-agent development environment',
+        epilog="Tests that need the cluster are marked 'slow'; run the rest with: "
+               "cd test && python3 -m pytest -m 'not slow'")
     
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
     